@@ -1,16 +1,638 @@
 #!/usr/bin/env python3
 import os
-import json
 import argparse
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from pathlib import Path
+import functools
+import gzip
+import html
+import operator
+import threading
+import time
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+_ICONS = {
+    '.iso': '💿', '.img': '💿',
+    '.zip': '📦', '.rar': '📦', '.7z': '📦', '.tar': '📦', '.gz': '📦',
+    '.mp4': '🎬', '.mkv': '🎬', '.avi': '🎬',
+    '.mp3': '🎵', '.flac': '🎵', '.wav': '🎵',
+    '.jpg': '🖼️', '.jpeg': '🖼️', '.png': '🖼️', '.gif': '🖼️',
+    '.pdf': '📕', '.doc': '📘', '.docx': '📘', '.txt': '📝',
+    '.html': '🌐', '.htm': '🌐',
+    '.py': '🐍', '.sh': '⚙️', '.exe': '⚙️',
+}
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+
+@functools.lru_cache(maxsize=1)
+def _load_config_file(path, mtime_ns):
+    # Ключ по mtime: пока файл не менялся, повторные вызовы бесплатны.
+    with open(path, 'rb') as f:
+        return _json.loads(f.read())
 
 class Config:
+    _cached = None
+    _cached_mtime_ns = None
+    _cached_base_folder = None
+
+    @classmethod
+    def get(cls, base_folder=None):
+        # Синглтон с горячей перезагрузкой: один stat config.json на вызов,
+        # пересборка только когда файл реально поменялся.
+        if base_folder is None:
+            base_folder = cls._cached_base_folder
+        try:
+            mtime_ns = os.stat(_CONFIG_FILE).st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        if (cls._cached is None or mtime_ns != cls._cached_mtime_ns
+                or base_folder != cls._cached_base_folder):
+            cls._cached = cls(base_folder=base_folder)
+            cls._cached_mtime_ns = mtime_ns
+            cls._cached_base_folder = base_folder
+        return cls._cached
+
     def __init__(self, base_folder=None):
         self.port = 8080
         self.host = '0.0.0.0'
         self.base_folder = os.path.abspath(base_folder or os.getcwd())
+        self.show_hidden = False
         self.ignore_folders = ['css', 'js', '__pycache__', '.git', 'node_modules', 'System32', 'SysWOW64', 'Windows', '$Recycle.Bin', 'Program Files', 'ProgramData', 'AppData']
+        self.ignore_files = ['monitor.py', 'config.json']
+        self.ignore_extensions = ['.pyc', '.log', '.tmp']
+        self.load_config()
+        # Членство проверяется на каждый элемент каждого листинга —
+        # frozenset вместо списка, расширения заранее в нижнем регистре.
+        self.ignore_folders = frozenset(self.ignore_folders)
+        self.ignore_files = frozenset(self.ignore_files)
+        self.ignore_extensions = frozenset(ext.lower() for ext in self.ignore_extensions)
+
+    def load_config(self):
+        try:
+            mtime_ns = os.stat(_CONFIG_FILE).st_mtime_ns
+            data = _load_config_file(_CONFIG_FILE, mtime_ns)
+        except (OSError, ValueError):
+            return
+        self.__dict__.update(data)
+
+class FileManager:
+    CACHE_MAX_ENTRIES = 256
+
+    def __init__(self, config):
+        self.config = config
+        self._listing_cache = OrderedDict()
+        self._count_cache = OrderedDict()
+        # Обработчики живут в отдельных потоках, кэши общие.
+        self._cache_lock = threading.Lock()
+
+    def _cache_get(self, cache, path, mtime_ns):
+        with self._cache_lock:
+            cached = cache.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                cache.move_to_end(path)
+                return cached[1]
+        return None
+
+    def _cache_put(self, cache, path, mtime_ns, value):
+        with self._cache_lock:
+            cache[path] = (mtime_ns, value)
+            cache.move_to_end(path)
+            if len(cache) > self.CACHE_MAX_ENTRIES:
+                cache.popitem(last=False)
+
+    def should_ignore(self, name, is_dir, suffix_lower):
+        # Вызывающий уже знает тип из DirEntry — сюда только данные,
+        # никаких повторных stat'ов.
+        if not self.config.show_hidden and name[0] == '.':
+            return True
+        if is_dir:
+            return name in self.config.ignore_folders
+        return name in self.config.ignore_files or suffix_lower in self.config.ignore_extensions
+
+    def _count_files(self, path, _seen_inodes=None):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+        if _seen_inodes is None:
+            _seen_inodes = set()
+        cached = self._cache_get(self._count_cache, path, mtime_ns)
+        if cached is not None:
+            direct, subdirs = cached
+        else:
+            direct = 0
+            subdirs = []
+            try:
+                it = os.scandir(path)
+            except OSError:
+                return 0
+            try:
+                for entry in it:
+                    name = entry.name
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    suffix = '' if is_dir else os.path.splitext(name)[1].lower()
+                    if self.should_ignore(name, is_dir, suffix):
+                        continue
+                    # Жёсткие ссылки на один inode считаем один раз.
+                    ino = entry.inode()
+                    if ino in _seen_inodes:
+                        continue
+                    _seen_inodes.add(ino)
+                    if is_dir:
+                        subdirs.append(entry.path)
+                    else:
+                        direct += 1
+            finally:
+                it.close()
+            self._cache_put(self._count_cache, path, mtime_ns, (direct, subdirs))
+
+        # Каждый уровень кэшируется по своему mtime: изменение глубоко в
+        # дереве пересканирует только свой каталог, выше идут кэш-попадания.
+        return direct + sum(self._count_files(sub, _seen_inodes) for sub in subdirs)
+
+    def get_directory_listing(self, rel_path=''):
+        path = os.path.join(self.config.base_folder, rel_path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self._cache_get(self._listing_cache, path, mtime_ns)
+        if cached is not None:
+            return cached
+
+        prefix = rel_path + '/' if rel_path else ''
+        items = {'folders': [], 'files': []}
+
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                is_dir = entry.is_dir(follow_symlinks=False)
+                suffix = '' if is_dir else os.path.splitext(name)[1].lower()
+                if self.should_ignore(name, is_dir, suffix):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                rel = prefix + name
+                info = {
+                    'name': name,
+                    '_sortkey_name': name.lower(),
+                    'path': rel,
+                    'name_html': html.escape(name),
+                    'path_html': html.escape(quote(rel, errors='surrogatepass')),
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                }
+                if is_dir:
+                    items['folders'].append(info)
+                else:
+                    info['icon'] = _ICONS.get(suffix, '📄')
+                    items['files'].append(info)
+
+        by_name = operator.itemgetter('_sortkey_name')
+        items['folders'].sort(key=by_name)
+        items['files'].sort(key=by_name)
+        self._cache_put(self._listing_cache, path, mtime_ns, items)
+        return items
+
+# Статика страницы кодируется один раз при импорте; на каждый запрос
+# рендерится только динамическая середина (статус, инфо, карточки, футер).
+_HTML_HEAD = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>ArchWay File Server</title>
+    <style>
+        :root {
+            --hacker-green: #00ff00;
+            --terminal-bg: #0a0a0a;
+            --panel-bg: #111111;
+        }
+
+        body {
+            background: var(--terminal-bg);
+            color: var(--hacker-green);
+            font-family: 'Monospace', 'Courier New', monospace;
+            margin: 0;
+            padding: 20px;
+            min-height: 100vh;
+        }
+
+        .crt::after {
+            content: " ";
+            display: block;
+            position: fixed;
+            top: 0;
+            left: 0;
+            bottom: 0;
+            right: 0;
+            background: linear-gradient(rgba(18, 16, 16, 0) 50%, rgba(0, 0, 0, 0.25) 50%);
+            background-size: 100% 4px;
+            z-index: 1000;
+            pointer-events: none;
+        }
+
+        .container {
+            max-width: 1400px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+
+        header {
+            text-align: center;
+            padding: 30px 0;
+            border-bottom: 2px solid var(--hacker-green);
+            margin-bottom: 30px;
+        }
+
+        h1 {
+            font-size: 3em;
+            margin: 0;
+            text-shadow: 0 0 10px var(--hacker-green);
+        }
+
+        .server-info {
+            background: var(--panel-bg);
+            border: 1px solid var(--hacker-green);
+            padding: 20px;
+            margin: 25px 0;
+        }
+
+        .files-grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
+            gap: 20px;
+            margin: 30px 0;
+        }
+
+        .file-card {
+            background: var(--panel-bg);
+            border: 1px solid rgba(0, 255, 0, 0.3);
+            padding: 20px;
+            transition: all 0.3s;
+        }
+
+        .file-card:hover {
+            border-color: var(--hacker-green);
+            box-shadow: 0 0 20px rgba(0, 255, 0, 0.2);
+        }
+
+        .file-icon {
+            font-size: 2.5em;
+            margin-bottom: 15px;
+        }
+
+        .file-name {
+            font-weight: bold;
+            font-size: 1.1em;
+            margin-bottom: 10px;
+            word-break: break-all;
+        }
+
+        .file-size {
+            color: #aaa;
+            margin: 5px 0;
+        }
+
+        .file-date {
+            color: #666;
+            font-size: 0.9em;
+            margin: 5px 0;
+        }
+
+        .download-btn {
+            display: inline-block;
+            background: transparent;
+            color: var(--hacker-green);
+            border: 2px solid var(--hacker-green);
+            padding: 10px 15px;
+            text-decoration: none;
+            font-family: inherit;
+            cursor: pointer;
+            transition: all 0.3s;
+            width: 100%;
+            text-align: center;
+            margin-top: 10px;
+        }
+
+        .download-btn:hover {
+            background: var(--hacker-green);
+            color: #000;
+        }
+
+        .status-online {
+            background: rgba(0, 255, 0, 0.1);
+            border: 2px solid #00ff00;
+            color: #00ff00;
+            padding: 15px;
+            text-align: center;
+            margin: 20px 0;
+        }
+
+        footer {
+            text-align: center;
+            margin-top: 50px;
+            padding-top: 30px;
+            border-top: 1px solid #333;
+            color: #666;
+        }
+
+        @media (max-width: 768px) {
+            .files-grid {
+                grid-template-columns: 1fr;
+            }
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <header>
+            <h1>ArchWay File Server</h1>
+            <div style="color: #aaa;">Local File Sharing</div>
+        </header>
+'''.encode('utf-8')
+
+_HTML_TAIL = '''
+    </div>
+
+    <script>
+        // Часы рисуются на клиенте: байты страницы не меняются каждую
+        // секунду и ответ можно кэшировать по ETag
+        document.getElementById('now').textContent = new Date().toLocaleTimeString();
+        // Счётчики файлов подтягиваются лениво: индекс не ходит по всему
+        // дереву, каждая папка считается отдельным запросом
+        document.querySelectorAll('.file-count').forEach(function(el) {
+            fetch('/_count?path=' + el.dataset.path)
+                .then(function(r) { return r.text(); })
+                .then(function(t) { el.textContent = t + ' файлов'; })
+                .catch(function() { el.textContent = '?'; });
+        });
+        // Авто-обновление страницы
+        setTimeout(function() {
+            location.reload();
+        }, 30000);
+    </script>
+</body>
+</html>'''.encode('utf-8')
+
+# Статика жмётся один раз при импорте; gzip-поток из нескольких членов —
+# валидный Content-Encoding: gzip.
+_HTML_HEAD_GZ = gzip.compress(_HTML_HEAD, compresslevel=6)
+_HTML_TAIL_GZ = gzip.compress(_HTML_TAIL, compresslevel=6)
+
+_FOLDER_TMPL = '''
+            <div class="file-card">
+                <div class="file-icon">📁</div>
+                <div class="file-name">{name_html}/</div>
+                <div class="file-size"><span class="file-count" data-path="{path_html}">…</span></div>
+                <div class="file-date">Modified: {date_str}</div>
+                <a href="/{path_html}/" class="download-btn">
+                    📂 Открыть
+                </a>
+            </div>'''
+
+_FILE_TMPL = '''
+            <div class="file-card">
+                <div class="file-icon">{icon}</div>
+                <div class="file-name">{name_html}</div>
+                <div class="file-size">Size: {size_str}</div>
+                <div class="file-date">Modified: {date_str}</div>
+                <a href="/{path_html}" class="download-btn" download>
+                    ⬇️ Download
+                </a>
+            </div>'''
+
+class HTMLGenerator:
+    def __init__(self, config):
+        self.config = config
+
+    def get_file_icon(self, filename, is_dir=False):
+        if is_dir:
+            return '📁'
+        dot = filename.rfind('.')
+        ext = filename[dot:].lower() if dot >= 0 else ''
+        return _ICONS.get(ext, '📄')
+
+    @staticmethod
+    def format_date(info):
+        # Лениво: строка считается при первом рендере и живёт в info,
+        # пока листинг сидит в кэше.
+        date_str = info.get('date_str')
+        if date_str is None:
+            date_str = time.strftime('%Y-%m-%d %H:%M', time.localtime(info['mtime']))
+            info['date_str'] = date_str
+        return date_str
+
+    def format_size(self, size):
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024:
+                return f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
+
+    def generate_index(self, items, rel_path=''):
+        folder_parts = []
+        for folder in items['folders']:
+            self.format_date(folder)
+            folder_parts.append(_FOLDER_TMPL.format_map(folder))
+        folders_html = ''.join(folder_parts)
+
+        file_parts = []
+        for file in items['files']:
+            self.format_date(file)
+            if 'size_str' not in file:
+                file['size_str'] = self.format_size(file['size'])
+            file_parts.append(_FILE_TMPL.format_map(file))
+        files_html = ''.join(file_parts)
+
+        up_html = ''
+        if rel_path:
+            parent = rel_path.rsplit('/', 1)[0] if '/' in rel_path else ''
+            up_html = f'<p><a href="/{html.escape(quote(parent, errors="surrogatepass"))}" style="color: var(--hacker-green);">⬆️ Наверх</a></p>'
+
+        total_files = len(items['files'])
+        total_size = sum(f['size'] for f in items['files'])
+
+        middle = f'''
+        <div class="status-online">
+            🟢 ONLINE - Last update: <span id="now"></span>
+        </div>
+
+        <div class="server-info">
+            <h3>📁 Available Files</h3>
+            <p>Directory: {html.escape(os.path.join(self.config.base_folder, rel_path))}</p>
+            <p>Auto-update every 30 seconds</p>
+            {up_html}
+        </div>
+
+        <div class="files-grid">{folders_html}{files_html}
+        </div>
+
+        <footer>
+            <p>ArchWay File Server • Files: {total_files} • Total: {self.format_size(total_size)}</p>
+        </footer>'''
+        # surrogateescape — как в stdlib'ном list_directory: имена с байтами
+        # вне UTF-8 уходят в страницу как есть, а не роняют обработчик.
+        return middle.encode('utf-8', 'surrogateescape')
+
+class ArchWayHTTPHandler(SimpleHTTPRequestHandler):
+    # Заполняются один раз в main(): обработчик создаётся на каждый запрос,
+    # и пересоздавать Config/FileManager там — это чтение config.json и
+    # перестройка ignore-списков на каждый GET.
+    config = None
+    fm = None
+    html_gen = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def refresh_shared(cls):
+        # Горячая перезагрузка config.json: Config.get() дёшев (один stat),
+        # FileManager/HTMLGenerator пересобираются только при смене конфига.
+        config = Config.get()
+        if config is not cls.config:
+            with cls._shared_lock:
+                if config is not cls.config:
+                    cls.fm = FileManager(config)
+                    cls.html_gen = HTMLGenerator(config)
+                    cls.config = config
+
+    # Узкий набор типов, которые сервер реально раздаёт: guess_type
+    # находит их здесь и не уходит в mimetypes (и его скан /etc/mime.types).
+    extensions_map = {
+        '.iso': 'application/octet-stream',
+        '.img': 'application/octet-stream',
+        '.zip': 'application/zip',
+        '.rar': 'application/vnd.rar',
+        '.7z': 'application/x-7z-compressed',
+        '.tar': 'application/x-tar',
+        '.gz': 'application/gzip',
+        '.mp4': 'video/mp4',
+        '.mkv': 'video/x-matroska',
+        '.avi': 'video/x-msvideo',
+        '.mp3': 'audio/mpeg',
+        '.flac': 'audio/flac',
+        '.wav': 'audio/x-wav',
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png',
+        '.gif': 'image/gif',
+        '.pdf': 'application/pdf',
+        '.doc': 'application/msword',
+        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        '.txt': 'text/plain; charset=utf-8',
+        '.html': 'text/html; charset=utf-8',
+        '.htm': 'text/html; charset=utf-8',
+        '.py': 'text/plain; charset=utf-8',
+        '.sh': 'text/plain; charset=utf-8',
+        '.exe': 'application/octet-stream',
+        '': 'application/octet-stream',
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.refresh_shared()
+        super().__init__(*args, directory=self.config.base_folder, **kwargs)
+
+    def copyfile(self, source, outputfile):
+        # Отдача файла через sendfile: данные идут внутри ядра, без
+        # промежуточного 16 КБ буфера в userspace.
+        if hasattr(os, 'sendfile'):
+            try:
+                in_fd = source.fileno()
+                out_fd = outputfile.fileno()
+            except (AttributeError, OSError, ValueError):
+                pass
+            else:
+                outputfile.flush()  # заголовки уходят до данных, идущих мимо буфера
+                start = offset = os.lseek(in_fd, 0, os.SEEK_CUR)
+                try:
+                    while True:
+                        sent = os.sendfile(out_fd, in_fd, offset, 1 << 20)
+                        if sent == 0:
+                            return
+                        offset += sent
+                except OSError:
+                    # Ничего не успели отправить (напр. TLS-обёртка или
+                    # не-mmap'ируемый источник) — падаем на копирование.
+                    if offset != start:
+                        raise
+                    os.lseek(in_fd, start, os.SEEK_SET)
+        super().copyfile(source, outputfile)
+
+    def _resolve_under_base(self, target):
+        # Разрешаем симлинки с обеих сторон: и '..' в запросе, и симлинк в
+        # пути самой хостимой папки не должны ломать сравнение.
+        base = os.path.realpath(self.config.base_folder)
+        full_path = os.path.realpath(os.path.join(base, target))
+        if full_path != base and not full_path.startswith(base + os.sep):
+            return None
+        return full_path
+
+    def _send_count(self):
+        target = parse_qs(urlsplit(self.path).query).get('path', [''])[0].strip('/')
+        full_path = self._resolve_under_base(target)
+        if full_path is None:
+            self.send_error(403, "Forbidden")
+            return
+        body = str(self.fm._count_files(full_path)).encode('ascii')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Нормализуем до проверки: строка запроса, %-кодирование и путь в
+        # подкаталоге не должны обходить запрет (/monitor.py?x=1, %2E и т.п.).
+        rel_path = unquote(urlsplit(self.path).path).strip('/')
+        base = rel_path.rsplit('/', 1)[-1]
+        dot = base.rfind('.')
+        if base in self.config.ignore_files or (
+                dot >= 0 and base[dot:].lower() in self.config.ignore_extensions):
+            self.send_error(403, "Forbidden")
+            return
+
+        if rel_path == '_count':
+            self._send_count()
+            return
+
+        full_path = self._resolve_under_base(rel_path)
+        if full_path is None:
+            self.send_error(403, "Forbidden")
+            return
+        if os.path.isdir(full_path):
+            try:
+                dir_mtime_ns = os.stat(full_path).st_mtime_ns
+            except OSError:
+                self.send_error(404, "Not Found")
+                return
+            etag = f'"{dir_mtime_ns:x}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            try:
+                items = self.fm.get_directory_listing(rel_path)
+            except OSError:
+                self.send_error(404, "Not Found")
+                return
+            middle = self.html_gen.generate_index(items, rel_path)
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                # Середина маленькая — быстрый уровень; статика уже сжата.
+                chunks = (_HTML_HEAD_GZ, gzip.compress(middle, compresslevel=1), _HTML_TAIL_GZ)
+                self.send_header('Content-Encoding', 'gzip')
+            else:
+                chunks = (_HTML_HEAD, middle, _HTML_TAIL)
+            self.send_header('Content-Length', str(sum(len(c) for c in chunks)))
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write(chunk)
+            return
+
+        super().do_GET()
 
 def main():
     parser = argparse.ArgumentParser(description="ArchWay File Server")
@@ -18,16 +640,15 @@ def main():
     parser.add_argument('--folder', '-f', default=None, help='Папка для хостинга')
     args = parser.parse_args()
 
-    config = Config(base_folder=args.folder)
+    config = Config.get(base_folder=args.folder)
+    config.port = args.port
 
-    class CustomHandler(SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, directory=config.base_folder, **kwargs)
+    ArchWayHTTPHandler.refresh_shared()
 
     print(f"🚀 Запуск на порту {args.port}")
     print(f"📁 Хостим папку: {config.base_folder}")
 
-    server = HTTPServer((config.host, args.port), CustomHandler)
+    server = ThreadingHTTPServer((config.host, args.port), ArchWayHTTPHandler)
     server.serve_forever()
 
 if __name__ == "__main__":